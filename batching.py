@@ -0,0 +1,72 @@
+import logging
+import re
+
+from ratelimit import estimate_tokens
+from tagger import tag_rows, tag_text
+from validate import matches_source
+
+MARKER_RE = re.compile(r"^=== POST (\d+) ===[ \t]*$", re.MULTILINE)
+
+
+def pack_batch(texts):
+    return "\n".join(f"=== POST {i} ===\n{text}" for i, text in enumerate(texts, 1))
+
+
+def unpack_batch(content, size):
+    """Split a batched response into one tagged text per post, or None if the markers are broken"""
+    parts = MARKER_RE.split(content)
+    preamble, numbers, bodies = parts[0], parts[1::2], parts[2::2]
+    if preamble.strip() or [int(n) for n in numbers] != list(range(1, size + 1)):
+        return None
+    return [body.strip() for body in bodies]
+
+
+def make_batches(rows, max_tokens, max_size):
+    """Group (key, data_id, text) rows into batches that fit a token budget"""
+    batch, batch_tokens = [], 0
+    for row in rows:
+        tokens = estimate_tokens(row[2])
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_size):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(row)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def tag_batch(batch_client, texts, data_ids, single_fn, limiter=None, retries=3, metrics=None):
+    """Tag several texts in one request, re-sending malformed posts one at a time via `single_fn`"""
+    if len(texts) == 1:
+        return [single_fn(texts[0], data_ids[0])]
+
+    label = f"batch {data_ids[0]}..{data_ids[-1]}"
+    content = tag_text(batch_client, pack_batch(texts), label, limiter=limiter, retries=retries, metrics=metrics)
+    parts = unpack_batch(content, len(texts)) if content != "ERROR" else None
+    if metrics is not None:
+        metrics.count("batches")
+        metrics.count("batch_posts", len(texts))
+    if parts is None:
+        if metrics is not None:
+            metrics.count("malformed_batches")
+        logging.warning(f"Malformed response for {label}, falling back to single requests")
+
+    results = []
+    for i, (text, data_id) in enumerate(zip(texts, data_ids)):
+        if parts is not None and matches_source(parts[i], text):
+            results.append(parts[i])
+        else:
+            if parts is not None:
+                logging.warning(f"[{data_id}] Batched output does not match source text, re-tagging alone")
+            results.append(single_fn(text, data_id))
+    return results
+
+
+def tag_rows_batched(rows, batch_fn, concurrency=8, max_tokens=2000, max_size=20):
+    """Like tag_rows, but sends rows in token-budgeted batches through `batch_fn(texts, data_ids)`"""
+    batches = (
+        ([key for key, _, _ in batch], [data_id for _, data_id, _ in batch], [text for _, _, text in batch])
+        for batch in make_batches(rows, max_tokens, max_size)
+    )
+    for keys, contents in tag_rows(batches, batch_fn, concurrency):
+        yield from zip(keys, contents)
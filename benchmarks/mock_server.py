@@ -0,0 +1,215 @@
+"""Local stand-in for the OpenRouter chat-completions API.
+
+Tags the user message with a small keyword vocabulary (or canned outputs),
+after a configurable delay, and can inject 500 errors, 429 throttling and
+runaway generations that stop echoing the input. Requests with "stream": true
+are answered with server-sent events:
+
+    python benchmarks/mock_server.py --port 8000 --latency 0.2 --error-rate 0.01 --throttle-rate 0.02
+    python main.py --api-url http://127.0.0.1:8000/v1/chat/completions
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Words the mock "model" recognises, with the entity tag it gives them
+VOCABULARY = {
+    "kecelakaan": "COND", "macet": "COND", "banjir": "COND", "longsor": "COND", "licin": "COND",
+    "motor": "VEH", "mobil": "VEH", "truk": "VEH", "bus": "VEH", "angkot": "VEH", "ojol": "VEH",
+    "polisi": "PWN", "ambulans": "PWN", "damkar": "PWN", "Dishub": "PWN",
+    "korban": "PWR", "warga": "PWR", "pengendara": "PWR",
+    "Sudirman": "PLOC", "Cawang": "PLOC", "Semanggi": "PLOC", "Kuningan": "PLOC", "Pancoran": "PLOC",
+    "tadi": "DAT", "skrg": "DAT", "besok": "DAT",
+    "pohon": "OBJ", "tiang": "OBJ",
+}
+MARKER_RE = re.compile(r"^=== POST \d+ ===[ \t]*$")
+WORD_RE = re.compile(r"\S+")
+PIECE_RE = re.compile(r"\S+\s*|\s+")
+RUNAWAY = " Penjelasan: teks di atas berisi laporan lalu lintas yang sudah saya tandai sesuai instruksi."
+
+
+def tag_line(line):
+    if MARKER_RE.match(line):
+        return line
+    return WORD_RE.sub(lambda match: (
+        f"<{VOCABULARY[match.group()]}>{match.group()}</{VOCABULARY[match.group()]}>"
+        if match.group() in VOCABULARY else match.group()
+    ), line)
+
+
+def tag_content(text, canned=None):
+    if canned and text in canned:
+        return canned[text]
+    return "\n".join(tag_line(line) for line in text.split("\n"))
+
+
+class MockConfig:
+    def __init__(self, latency=0.1, jitter=0.5, error_rate=0.0, throttle_rate=0.0, retry_after=1.0,
+                 canned=None, seed=None, runaway_rate=0.0, token_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.canned = canned or {}
+        self.runaway_rate = runaway_rate
+        self.token_latency = token_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def draw(self):
+        with self.lock:
+            self.requests += 1
+            return self.random.random(), self.random.uniform(1 - self.jitter, 1 + self.jitter), self.random.random()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length))
+        config = self.config
+        roll, jitter, runaway_roll = config.draw()
+
+        if roll < config.throttle_rate:
+            self._send_json(429, {"error": {"message": "Rate limit exceeded"}},
+                            {"Retry-After": f"{config.retry_after:g}"})
+            return
+        time.sleep(max(0.0, config.latency * jitter))
+        if roll < config.throttle_rate + config.error_rate:
+            self._send_json(500, {"error": {"message": "Internal error"}})
+            return
+
+        messages = request["messages"]
+        content = tag_content(messages[-1]["content"], config.canned)
+        if runaway_roll < config.runaway_rate:
+            content += RUNAWAY * 20
+        finish_reason = "stop"
+        max_tokens = request.get("max_tokens")
+        if max_tokens and len(content) // 4 + 1 > max_tokens:
+            content, finish_reason = content[:max_tokens * 4], "length"
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if request.get("stream"):
+            self._send_stream(request.get("model"), content, finish_reason, usage)
+            return
+        self._send_json(200, {
+            "model": request.get("model"),
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    def _send_stream(self, model, content, finish_reason, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(data):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def event(payload):
+            write_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+        try:
+            write_chunk(b": OPENROUTER PROCESSING\n\n")
+            for piece in PIECE_RE.findall(content):
+                time.sleep(self.config.token_latency)
+                event({"model": model, "choices": [{"delta": {"content": piece}, "finish_reason": None}]})
+            event({"model": model, "choices": [{"delta": {}, "finish_reason": finish_reason}], "usage": usage})
+            write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client aborted the generation
+            self.close_connection = True
+
+
+class MockServer(ThreadingHTTPServer):
+    # The default backlog of 5 resets connections when a whole worker pool connects at once
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients close keep-alive connections when they abort a stream or exit
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """Start the mock API in a background thread; returns (server, chat-completions URL)"""
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"config": config})
+    server = MockServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.1, help="mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="relative spread of the delay (0.5 = +/-50%%)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--runaway-rate", type=float, default=0.0,
+                        help="fraction of responses that keep generating commentary after the tagged text")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="delay between streamed pieces in seconds")
+    parser.add_argument("--canned", default=None, help="JSON file mapping input text to tagged output")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args):
+    canned = None
+    if args.canned:
+        with open(args.canned, encoding="utf-8") as f:
+            canned = json.load(f)
+    return MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      throttle_rate=args.throttle_rate, retry_after=args.retry_after, canned=canned, seed=args.seed,
+                      runaway_rate=args.runaway_rate, token_latency=args.token_latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_server(config_from_args(args), args.host, args.port)
+    print(f"Mock chat-completions API listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
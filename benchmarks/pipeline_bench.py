@@ -0,0 +1,126 @@
+"""End-to-end pipeline benchmark against the local mock API.
+
+For each corpus size, writes a synthetic data.csv into a scratch directory,
+runs main.py on it (reading, tagging, journaling, tokenizing, final assembly)
+and reports rows/s and peak memory. Results are appended to a JSONL file so
+runs can be compared over time:
+
+    python benchmarks/pipeline_bench.py --rows 1000 100000 --latency 0.05 --concurrency 64
+    python benchmarks/pipeline_bench.py --rows 1000 -- --batch-tokens 400 --retokenize
+
+Arguments after "--" are passed to main.py.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_server import VOCABULARY, add_mock_arguments, config_from_args, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FILLER = ["ada", "di", "jalan", "arah", "sampai", "hati2", "yg", "lewat", "dekat", "sdh", "parah", "total",
+          "km", "5", "jam", "07.15", "WIB", "tolong", "info", "dr", "temen", "depan", "sekolah"]
+WORDS = FILLER * 3 + list(VOCABULARY)
+
+
+def write_corpus(path, rows, duplicate_rate=0.05, seed=0):
+    """Synthetic export with the columns main.py reads, plus a few it should ignore"""
+    rng = random.Random(seed)
+    posts = []
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["index", "created_at", "username", "full_text", "is_aduan", "retweet_count"])
+        for index in range(rows):
+            if posts and rng.random() < duplicate_rate:
+                text = rng.choice(posts)
+            else:
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+                if len(posts) < 1000:
+                    posts.append(text)
+            writer.writerow([index, f"2025-01-01T00:{index % 60:02d}:00", f"user{rng.randint(1, 5000)}",
+                             text, int(rng.random() < 0.6), rng.randint(0, 50)])
+
+
+def run_once(rows, url, workdir, main_args, duplicate_rate):
+    write_corpus(os.path.join(workdir, "data.csv"), rows, duplicate_rate)
+    command = [sys.executable, os.path.join(ROOT, "main.py"), "--api-url", url, *main_args]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    with open(os.path.join(workdir, "metrics.json"), encoding="utf-8") as f:
+        metrics = json.load(f)
+    tagged = metrics["counters"].get("rows", 0)
+    return {
+        "rows": rows,
+        "tagged_rows": tagged,
+        "seconds": elapsed,
+        "rows_per_second": tagged / elapsed if elapsed else 0.0,
+        "peak_memory_mb": usage.ru_maxrss / 1024,
+        "exit_code": process.returncode,
+        "requests": metrics["counters"].get("requests", 0),
+        "retries": metrics["counters"].get("retries", 0),
+        "errors": metrics["counters"].get("errors", 0),
+        "aborted_generations": metrics["counters"].get("aborted_generations", 0),
+        "stage_seconds": metrics["stage_seconds"],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    argv = sys.argv[1:]
+    main_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, main_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000], help="corpus sizes")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="fraction of repeated posts")
+    parser.add_argument("--results", default=os.path.join(ROOT, "benchmarks", "results.jsonl"),
+                        help="JSONL file results are appended to")
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server, url = start_server(config_from_args(args))
+    main_args = ["--concurrency", str(args.concurrency), "--metrics-interval", "3600", *main_args]
+    run = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "main_args": main_args,
+        "mock": {"latency": args.latency, "error_rate": args.error_rate, "throttle_rate": args.throttle_rate,
+                 "runaway_rate": args.runaway_rate},
+    }
+
+    print(f"{'rows':>9} {'tagged':>8} {'seconds':>9} {'rows/s':>9} {'peak MB':>8} {'retries':>8} {'errors':>7}")
+    with open(args.results, "a", encoding="utf-8") as results:
+        for rows in args.rows:
+            with tempfile.TemporaryDirectory() as workdir:
+                result = run_once(rows, url, workdir, main_args, args.duplicate_rate)
+            print(f"{result['rows']:>9} {result['tagged_rows']:>8} {result['seconds']:>9.1f} "
+                  f"{result['rows_per_second']:>9.1f} {result['peak_memory_mb']:>8.1f} "
+                  f"{result['retries']:>8} {result['errors']:>7}")
+            results.write(json.dumps({**run, **result}) + "\n")
+            results.flush()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
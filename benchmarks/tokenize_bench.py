@@ -0,0 +1,72 @@
+"""Compare the BIO tokenizer in bio.py with the previous BeautifulSoup path.
+
+Run from the repository root:
+
+    python benchmarks/tokenize_bench.py --rows 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bio import tokenize_rows  # noqa: E402
+
+SAMPLES = [
+    "Ada <COND>kecelakaan</COND> di <PLOC>Jl. Gatot Subroto km 5,5</PLOC> arah <PLOC>Cawang</PLOC>, <CRD>3 mobil</CRD> terlibat. <COND>Macet parah</COND> sampai <PLOC>Semanggi</PLOC>. <PWN>Polisi</PWN> dan <PWN>ambulans</PWN> sdh di lokasi. Terjadi sktr <PTI>jam 07.15 WIB</PTI> <DAT>tadi</DAT>.",
+    "Info dr temen: <COND>banjir</COND> di daerah <PLOC>Kelapa Gading</PLOC> <DAT>skrg</DAT> ketinggian <QTY>50cm</QTY>, <PLOC>Jl. Boulevard utara</PLOC> gabisa dilewati <VEH>mobil kecil</VEH>. Perlu <VEH>perahu karet</VEH> & bantuan evakuasi utk <PWR>warga lansia</PWR> di <PLOC>Perumahan KGP blok C3</PLOC>.",
+    "<COND>Kecelakaan</COND> antara <VEH>bus pariwisata</VEH> dan <VEH>motor</VEH> di <LLOC>depan Mall Grand Indonesia</LLOC>. <CRD>2</CRD> <PWR>penumpang motor</PWR> terluka dan dirawat <PWR>warga</PWR>. <PWN>Petugas ambulans</PWN> dan <PWN>polisi</PWN> sudah datang menangani <PWR>para korban</PWR>.",
+    "<PLOC>Jl. Asia Afrika</PLOC> <COND>macet total</COND> karena ada <EVT>pawai budaya perayaan HUT Kota Bandung</EVT>. <COND>Penutupan jalan</COND> sejak <PTI>pukul 08.00 pagi</PTI> sampai selesai acara.",
+]
+
+
+def tokenize_soup(data_ids, tagged_texts):
+    """The BeautifulSoup tokenizer that tokenize_and_save() used before bio.py"""
+    all_tokens_labels = []
+    for data_id, tagged_text in zip(data_ids, tagged_texts):
+        soup = BeautifulSoup(tagged_text, "html.parser")
+        for content in soup.contents:
+            if content.name:
+                tag = content.name.upper()
+                tokens = content.text.strip().split()
+                for i, token in enumerate(tokens):
+                    prefix = "B-" if i == 0 else "I-"
+                    all_tokens_labels.append((data_id, token, f"{prefix}{tag}"))
+            else:
+                for token in content.strip().split():
+                    all_tokens_labels.append((data_id, token, "O"))
+    return all_tokens_labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    tagged_texts = [random.choice(SAMPLES) for _ in range(args.rows)]
+    data_ids = list(range(args.rows))
+
+    start = time.perf_counter()
+    expected = tokenize_soup(data_ids, tagged_texts)
+    soup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns, issues = tokenize_rows(data_ids, tagged_texts)
+    fast_time = time.perf_counter() - start
+
+    actual = list(zip(columns["Data ID"], columns["Token"], columns["Label"]))
+    print(f"rows:          {args.rows}")
+    print(f"tokens:        {len(actual)}")
+    print(f"beautifulsoup: {soup_time:.3f}s ({args.rows / soup_time:,.0f} rows/s)")
+    print(f"bio.py:        {fast_time:.3f}s ({args.rows / fast_time:,.0f} rows/s)")
+    print(f"speedup:       {soup_time / fast_time:.1f}x")
+    print(f"identical:     {actual == expected} ({len(issues)} issues reported)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import csv
+import html
+import logging
+import os
+import re
+import time
+from itertools import repeat
+
+import pandas as pd
+
+from prompt import ENTITY_TAGS
+
+ANNOTATIONS_FILE = "annotated_tokens.csv"
+TAG_TOKEN_RE = re.compile(r"<(/?)([A-Za-z][A-Za-z0-9]*)>")
+
+
+def _add_tokens(columns, data_id, text, tag):
+    if columns is None:
+        return
+    tokens = html.unescape(text).split()
+    if not tokens:
+        return
+    columns["Data ID"].extend([data_id] * len(tokens))
+    columns["Token"].extend(tokens)
+    if tag is None:
+        columns["Label"].extend(["O"] * len(tokens))
+    else:
+        columns["Label"].append(f"B-{tag}")
+        columns["Label"].extend([f"I-{tag}"] * (len(tokens) - 1))
+
+
+def tokenize_tagged(data_id, tagged_text, columns, issues):
+    """Append the BIO tokens of one tagged text to `columns`, recording malformed tags in `issues`.
+
+    With `columns=None` only the tag structure is checked and no tokens are built.
+
+    Only top-level tags from ENTITY_TAGS become entities. Nested tags are
+    flattened into the outer entity and unknown tags are treated as plain text;
+    both are reported as (data_id, message) pairs.
+    """
+    entity = None       # tag of the entity we are inside, if any
+    entity_text = []    # text pieces of the current entity
+    depth = 0           # nested tags opened inside the current entity
+    pos = 0
+
+    for match in TAG_TOKEN_RE.finditer(tagged_text):
+        text = tagged_text[pos:match.start()]
+        pos = match.end()
+        closing, name = match.group(1), match.group(2).upper()
+
+        if entity is None:
+            _add_tokens(columns, data_id, text, None)
+            if closing:
+                # Closing tags of unknown tags were already reported when they opened
+                if name in ENTITY_TAGS:
+                    issues.append((data_id, f"closing tag </{name}> without opening tag"))
+            elif name not in ENTITY_TAGS:
+                issues.append((data_id, f"unknown tag <{name}>"))
+            else:
+                entity, entity_text, depth = name, [], 0
+            continue
+
+        entity_text.append(text)
+        if not closing:
+            issues.append((data_id, f"nested tag <{name}> inside <{entity}>"))
+            depth += 1
+        elif depth:
+            depth -= 1
+        elif name == entity:
+            _add_tokens(columns, data_id, "".join(entity_text), entity)
+            entity = None
+        else:
+            issues.append((data_id, f"mismatched closing tag </{name}> inside <{entity}>"))
+
+    text = tagged_text[pos:]
+    if entity is None:
+        _add_tokens(columns, data_id, text, None)
+    else:
+        issues.append((data_id, f"unclosed tag <{entity}>"))
+        entity_text.append(text)
+        _add_tokens(columns, data_id, "".join(entity_text), entity)
+
+
+def tokenize_rows(data_ids, tagged_texts):
+    """BIO-tokenize many tagged texts into column arrays.
+
+    Returns ({"Data ID": [...], "Token": [...], "Label": [...]}, issues).
+    Callers are expected to filter out "ERROR" and empty rows first.
+    """
+    columns = {"Data ID": [], "Token": [], "Label": []}
+    issues = []
+    for data_id, tagged_text in zip(data_ids, tagged_texts):
+        tokenize_tagged(data_id, tagged_text, columns, issues)
+    return columns, issues
+
+
+class BIOWriter:
+    """Append-only CSV of BIO tokens, extended as each row is tagged.
+
+    Every row's tokens share a `Block` id. A row that is tagged again (for
+    example after a crash between writing its tokens and journaling it) gets a
+    newer block, and write_final_annotations() keeps only the newest one. Rows
+    without tokens ("ERROR" or empty output) get a block holding a single
+    tombstone line with an empty token, so they too supersede older blocks.
+    """
+
+    FIELDS = ["Data ID", "Token", "Label", "Block"]
+
+    def __init__(self, filename=ANNOTATIONS_FILE, fsync=True):
+        self.filename = filename
+        self.fsync = fsync
+        self._last_block = 0
+        is_new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        needs_newline = False
+        if not is_new:
+            with open(filename, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        self._file = open(filename, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(self.FIELDS)
+        elif needs_newline:
+            self._file.write("\n")
+
+    def append(self, data_id, tagged_text):
+        """Tokenize one tagged row and append its tokens, returning any malformed-tag issues"""
+        columns = {"Data ID": [], "Token": [], "Label": []}
+        issues = []
+        if isinstance(tagged_text, str) and tagged_text != "ERROR":
+            tokenize_tagged(data_id, tagged_text, columns, issues)
+        if not columns["Token"]:
+            columns = {"Data ID": [data_id], "Token": [""], "Label": [""]}
+        # Microsecond timestamps stay exact when pandas reads them as floats
+        block = max(time.time_ns() // 1000, self._last_block + 1)
+        self._last_block = block
+        self._writer.writerows(zip(columns["Data ID"], columns["Token"], columns["Label"], repeat(block)))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        return issues
+
+    def close(self):
+        self._file.close()
+
+
+def _read_chunks(filenames, **kwargs):
+    for filename in filenames:
+        yield from pd.read_csv(filename, **kwargs)
+
+
+def write_final_annotations(output_filename, filenames=(ANNOTATIONS_FILE,), chunksize=100000):
+    """Concatenate incremental token files into the final (Data ID, Token, Label) CSV.
+
+    Reads the incremental files twice in chunks: once to find the newest block
+    of every row, once to copy those blocks out, leaving out tombstones.
+    Returns the number of tokens.
+    """
+    read_opts = dict(chunksize=chunksize, dtype={"Token": str, "Label": str}, keep_default_na=False,
+                     on_bad_lines="skip")
+
+    latest = {}
+    for chunk in _read_chunks(filenames, usecols=["Data ID", "Block"], **read_opts):
+        chunk = chunk.assign(Block=pd.to_numeric(chunk["Block"], errors="coerce")).dropna(subset=["Block"])
+        for data_id, block in chunk.groupby("Data ID")["Block"].max().items():
+            block = int(block)
+            if block > latest.get(data_id, -1):
+                latest[data_id] = block
+
+    total = 0
+    header = True
+    with open(output_filename, "w", newline="", encoding="utf-8") as out:
+        for chunk in _read_chunks(filenames, **read_opts):
+            blocks = pd.to_numeric(chunk["Block"], errors="coerce")
+            keep = blocks.eq(chunk["Data ID"].map(latest)) & chunk["Token"].ne("")
+            chunk = chunk.loc[keep, ["Data ID", "Token", "Label"]]
+            chunk.to_csv(out, index=False, header=header)
+            header = False
+            total += len(chunk)
+        if header:
+            out.write("Data ID,Token,Label\n")
+
+    logging.info(f"Final annotations ({total} tokens) saved to: {output_filename}")
+    return total
@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from validate import matches_source
+
+CACHE_FILE = "response_cache.sqlite"
+
+URL_RE = re.compile(r"https?://\S+")
+MENTION_RE = re.compile(r"@\w+")
+VOLATILE_RE = re.compile(r"https?://\S+|@\w+")
+
+
+def normalize_text(text, loose=False):
+    """Cache key text: exact by default; with `loose`, URLs, mentions and whitespace are collapsed"""
+    if not loose:
+        return text
+    text = URL_RE.sub("<url>", text)
+    text = MENTION_RE.sub("<mention>", text)
+    return " ".join(text.split())
+
+
+class ResponseCache:
+    """On-disk cache of tagged outputs keyed by (normalized text, model, system prompt).
+
+    Entries written under another model or system prompt are dropped when the
+    cache is opened, and the least recently used entries are evicted once the
+    stored responses exceed `max_bytes`. If `is_valid(response, text)` is given,
+    responses failing it are neither stored nor served.
+    """
+
+    def __init__(self, model, system_prompt, filename=CACHE_FILE, max_bytes=512 * 1024 * 1024, loose=False,
+                 is_valid=None):
+        self.filename = filename
+        self.is_valid = is_valid
+        self.max_bytes = max_bytes
+        self.loose = loose
+        self.namespace = hashlib.sha256(f"{model}\0{system_prompt}".encode("utf-8")).hexdigest()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, namespace TEXT, source TEXT, response TEXT, size INTEGER, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        stale = self._conn.execute("DELETE FROM responses WHERE namespace != ?", (self.namespace,)).rowcount
+        self._conn.commit()
+        if stale:
+            logging.info(f"Dropped {stale} cached responses from a previous model or system prompt")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def key(self, text):
+        normalized = normalize_text(text, self.loose)
+        return hashlib.sha256(f"{self.namespace}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, text):
+        """Cached tagged output for `text`, or None"""
+        key = self.key(text)
+        with self._lock:
+            row = self._conn.execute("SELECT source, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+        if row is None:
+            return None
+        source, response = row
+        if source != text:
+            response = _transplant(response, text)
+        if response is not None and self.is_valid is not None and not self.is_valid(response, text):
+            return None
+        return response
+
+    def put(self, text, response):
+        if self.is_valid is not None and not self.is_valid(response, text):
+            return
+        key = self.key(text)
+        size = len(text.encode("utf-8")) + len(response.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, namespace, source, response, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.namespace, text, response, size, time.time())
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop the oldest tenth of the entries until we are back under budget
+        while self._size > self.max_bytes:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count == 0:
+                break
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (max(1, count // 10),)
+            )
+            self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        logging.info(f"Evicted cached responses, cache now {self._size} bytes")
+
+    def lookup_or_tag(self, text, data_id, tag_fn):
+        """Return the cached output for `text`, or tag it with `tag_fn` and cache the result.
+
+        Identical texts requested at the same time are only sent once; the
+        other callers wait for the first one to finish.
+        """
+        key = self.key(text)
+        while True:
+            cached = self.get(text)
+            if cached is not None:
+                self.record_lookups(hits=1)
+                logging.info(f"Cache hit for data ID {data_id}")
+                return cached
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()
+            # The first request may have failed; only retry through the cache once
+            if self.get(text) is None:
+                self.record_lookups(misses=1)
+                return self._tag_and_store(text, data_id, tag_fn, key=None)
+
+        return self._tag_and_store(text, data_id, tag_fn, key=key)
+
+    def _tag_and_store(self, text, data_id, tag_fn, key):
+        try:
+            content = tag_fn(text, data_id)
+            if content != "ERROR":
+                self.put(text, content)
+            return content
+        finally:
+            if key is not None:
+                with self._lock:
+                    self._inflight.pop(key).set()
+
+    def record_lookups(self, hits=0, misses=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"Response cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
+
+    def close(self):
+        self._conn.close()
+
+
+def _transplant(response, text):
+    """Reuse a tagged output of a loosely equal source for `text` by swapping in its URLs and mentions"""
+    replacements = iter(VOLATILE_RE.findall(text))
+    try:
+        candidate = VOLATILE_RE.sub(lambda match: next(replacements), response)
+    except StopIteration:
+        return None
+    return candidate if matches_source(candidate, text) else None
+
+
+def cached_tag_fn(cache, tag_fn):
+    """Wrap a `tag_fn(text, data_id)` so cache hits skip the network call"""
+    def tag(text, data_id):
+        return cache.lookup_or_tag(text, data_id, tag_fn)
+    return tag
+
+
+def cached_batch_fn(cache, batch_fn):
+    """Wrap a `batch_fn(texts, data_ids)` so only cache misses are sent in the batch"""
+    def tag(texts, data_ids):
+        results = [cache.get(text) for text in texts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        cache.record_lookups(hits=len(texts) - len(missing), misses=len(missing))
+        if missing:
+            contents = batch_fn([texts[i] for i in missing], [data_ids[i] for i in missing])
+            for i, content in zip(missing, contents):
+                results[i] = content
+                if content != "ERROR":
+                    cache.put(texts[i], content)
+        return results
+    return tag
@@ -0,0 +1,226 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from ratelimit import estimate_tokens
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Connect time of the request currently running on this thread
+_timings = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _timings.connect = getattr(_timings, "connect", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _timings.connect = getattr(_timings, "connect", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record how long the TCP+TLS handshake took"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class OpenRouterClient:
+    """Chat-completions client with a pooled keep-alive session.
+
+    The request body (model and system prompt) is serialized once; each call
+    only encodes the user text and splices it into the template. With `stream`,
+    completions are read as server-sent events and can be aborted early.
+    """
+
+    def __init__(self, api_key, model, system_prompt, url=OPENROUTER_URL, pool_size=8, timeout=30, stream=False):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.stream = stream
+        self.system_tokens = estimate_tokens(system_prompt)
+
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+
+        template = json.dumps({
+            "model": model,
+            "messages": [{"role": "system", "content": system_prompt}]
+        })
+        # Drop the closing "]}" so the user message can be appended to the list
+        self._body_prefix = template[:-2].encode("utf-8") + b', {"role": "user", "content": '
+        self._body_suffix = b"}]}"
+
+    def build_body(self, text, **options):
+        """Request body for `text`; `options` (e.g. stream, max_tokens) are added as top-level fields"""
+        prefix = self._body_prefix
+        if options:
+            prefix = b"{" + json.dumps(options)[1:-1].encode("utf-8") + b", " + prefix[1:]
+        return prefix + json.dumps(text).encode("utf-8") + self._body_suffix
+
+    def post(self, text):
+        """Send one text, returning (response, timing) where timing holds connect/ttfb/total seconds"""
+        body = self.build_body(text)
+        _timings.connect = 0.0
+        start = time.perf_counter()
+        response = self.session.post(self.url, data=body, timeout=self.timeout, stream=True)
+        ttfb = time.perf_counter() - start
+        response.content  # read the body so the connection goes back to the pool
+        total = time.perf_counter() - start
+        timing = {"connect": _timings.connect, "ttfb": ttfb, "total": total}
+        return response, timing
+
+    def post_stream(self, text, max_tokens=None, check=None):
+        """Stream one completion, returning (response, timing, completion).
+
+        `completion` is None for non-200 responses, otherwise a dict with the
+        generated `content`, `usage` (if sent) and `aborted`: a reason string
+        when `check(partial_content)` returned one, the token budget ran out or
+        the stream ended before the completion finished. Timing also holds
+        `ttft`, the time to the first content token.
+        """
+        options = {"stream": True}
+        if max_tokens:
+            options["max_tokens"] = max_tokens
+        body = self.build_body(text, **options)
+        _timings.connect = 0.0
+        start = time.perf_counter()
+        response = self.session.post(self.url, data=body, timeout=self.timeout, stream=True)
+        timing = {"connect": _timings.connect, "ttfb": time.perf_counter() - start, "ttft": None}
+
+        if response.status_code != 200:
+            response.content
+            timing["total"] = time.perf_counter() - start
+            return response, timing, None
+
+        content = ""
+        usage = {}
+        aborted = None
+        finished = False
+        lines = response.iter_lines()
+        for line in lines:
+            # Skip keep-alive comments (": OPENROUTER PROCESSING") and other SSE fields
+            if not line.startswith(b"data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == b"[DONE]":
+                finished = True
+                break
+            try:
+                chunk = json.loads(payload)
+            except ValueError:
+                aborted = "unreadable stream chunk"
+                break
+            if not isinstance(chunk, dict):
+                aborted = "unreadable stream chunk"
+                break
+            error = chunk.get("error")
+            if error:
+                message = error.get("message", error) if isinstance(error, dict) else error
+                aborted = f"stream error: {message}"
+                break
+            usage = chunk.get("usage") or usage
+            choice = (chunk.get("choices") or [{}])[0]
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                if timing["ttft"] is None:
+                    timing["ttft"] = time.perf_counter() - start
+                content += delta
+                if max_tokens and estimate_tokens(content) > max_tokens:
+                    aborted = "output token budget exhausted"
+                    break
+                if check is not None:
+                    aborted = check(content)
+                    if aborted:
+                        break
+            if choice.get("finish_reason") == "length":
+                aborted = "output token budget exhausted"
+                break
+            if choice.get("finish_reason") == "stop":
+                finished = True
+
+        if not aborted and not finished:
+            aborted = "stream ended before completion"
+        elif not aborted and not content.strip():
+            aborted = "empty content"
+        if aborted:
+            # Closing the connection stops the generation instead of paying for the rest of it
+            response.close()
+        else:
+            # Read to the end of the body so the connection goes back to the pool
+            for _ in lines:
+                pass
+        timing["total"] = time.perf_counter() - start
+        return response, timing, {"content": content, "usage": usage, "aborted": aborted}
+
+    def complete(self, text, max_tokens=None, check=None):
+        """Like post_stream, for either mode; `max_tokens` and `check` only apply when streaming.
+
+        A 200 response without usable content (an error body, no choices,
+        null or blank content) comes back as an aborted completion.
+        """
+        if self.stream:
+            return self.post_stream(text, max_tokens=max_tokens, check=check)
+        response, timing = self.post(text)
+        if response.status_code != 200:
+            return response, timing, None
+        completion = {"content": "", "usage": {}, "aborted": None}
+        try:
+            result = response.json()
+        except ValueError:
+            completion["aborted"] = "unreadable response"
+            return response, timing, completion
+        if not isinstance(result, dict):
+            completion["aborted"] = "unreadable response"
+            return response, timing, completion
+
+        completion["usage"] = result.get("usage") or {}
+        choices = result.get("choices")
+        if not choices or not isinstance(choices[0], dict):
+            error = result.get("error")
+            if error:
+                message = error.get("message", error) if isinstance(error, dict) else error
+                completion["aborted"] = f"error in response: {message}"
+            else:
+                completion["aborted"] = "no choices in response"
+            return response, timing, completion
+        content = (choices[0].get("message") or {}).get("content")
+        if not isinstance(content, str) or not content.strip():
+            completion["aborted"] = "empty content"
+            return response, timing, completion
+        completion["content"] = content
+        return response, timing, completion
+
+    def close(self):
+        self.session.close()
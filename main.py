@@ -1,14 +1,23 @@
-import requests
+import argparse
 import pandas as pd
 from tqdm import tqdm
-import time
 import os
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 import datetime
 import logging
-import json
-from prompt import system_prompt
+from prompt import system_prompt, batch_system_prompt
+from bio import ANNOTATIONS_FILE, BIOWriter, tokenize_rows, write_final_annotations
+from batching import tag_batch, tag_rows_batched
+from cache import CACHE_FILE, ResponseCache, cached_tag_fn, cached_batch_fn
+from client import OPENROUTER_URL, OpenRouterClient
+from metrics import METRICS_FILE, Metrics
+from progress import (PROGRESS_FILE, ProgressJournal, import_legacy_progress, iter_progress, load_progress,
+                      processed_indices, compact_progress)
+from reader import iter_aduan_rows, count_aduan_rows
+from ratelimit import RateLimiter
+from shard import parse_shard, shard_filename
+from tagger import tag_text, tag_rows
+from validate import VALIDATION_REPORT_FILE, is_valid_output, validate_journal, validate_output
 
 # Set up logging
 logging.basicConfig(
@@ -19,35 +28,18 @@ logging.basicConfig(
 
 def tokenize_and_save(tagged_data, output_prefix="partial"):
     """Tokenize the tagged data and save to file"""
-    all_tokens_labels = []
-    for idx, row in tagged_data.iterrows():
-        data_id = row['index']
-        tagged_text = row['tagged_full_text']
-        
-        if tagged_text == "ERROR" or pd.isna(tagged_text):
-            logging.warning(f"Skipping tokenization for data ID {data_id} due to ERROR or empty value")
-            continue
-            
-        try:
-            soup = BeautifulSoup(tagged_text, "html.parser")
-
-            for content in soup.contents:
-                if content.name:  # It's a tag (e.g., <location>Jakarta</location>)
-                    tag = content.name.upper()
-                    tokens = content.text.strip().split()
-                    for i, token in enumerate(tokens):
-                        prefix = "B-" if i == 0 else "I-"
-                        all_tokens_labels.append((data_id, token, f"{prefix}{tag}"))
-                else:  # It's plain text
-                    tokens = content.strip().split()
-                    for token in tokens:
-                        if token:
-                            all_tokens_labels.append((data_id, token, "O"))
-        except Exception as e:
-            logging.error(f"Error tokenizing row {idx} (data ID {data_id}): {str(e)}")
+    tagged = tagged_data[['index', 'tagged_full_text']]
+    skipped = tagged['tagged_full_text'].isna() | (tagged['tagged_full_text'] == "ERROR")
+    for data_id in tagged.loc[skipped, 'index']:
+        logging.warning(f"Skipping tokenization for data ID {data_id} due to ERROR or empty value")
+    tagged = tagged[~skipped]
+
+    columns, issues = tokenize_rows(tagged['index'].tolist(), tagged['tagged_full_text'].astype(str).tolist())
+    for data_id, message in issues:
+        logging.warning(f"Malformed tags in data ID {data_id}: {message}")
 
     # Create DataFrame
-    df = pd.DataFrame(all_tokens_labels, columns=["Data ID", "Token", "Label"])
+    df = pd.DataFrame(columns, columns=["Data ID", "Token", "Label"])
 
     # Get the current timestamp
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -63,126 +55,194 @@ def tokenize_and_save(tagged_data, output_prefix="partial"):
     
     return df
 
-def save_progress(df, filename="tagging_progress.csv"):
-    """Save the current tagging progress to a file"""
-    df.to_csv(filename, index=False)
-    logging.info(f"Progress saved to {filename}")
-    print(f"Progress saved to {filename}")
-
-def load_progress(filename="tagging_progress.csv"):
-    """Load the previous tagging progress if available"""
-    if os.path.exists(filename):
-        logging.info(f"Loading previous progress from {filename}")
-        return pd.read_csv(filename)
-    return None
-
-def main():
+def backfill_annotations(bio_writer, progress_file):
+    """Tokenize every row already in the progress journal into the incremental token file"""
+    logging.info(f"Tokenizing previously tagged rows into {bio_writer.filename}")
+    for record in iter_progress(progress_file):
+        for message in bio_writer.append(record['index'], record['tagged_full_text']):
+            logging.warning(f"Malformed tags in data ID {record['index']}: {message}")
+    bio_writer.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tag aduan texts with NER entities using an LLM")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of requests in flight at once")
+    parser.add_argument("--rpm", type=int, default=None, help="requests-per-minute budget (default: unlimited)")
+    parser.add_argument("--tpm", type=int, default=None, help="tokens-per-minute budget (default: unlimited)")
+    parser.add_argument("--retries", type=int, default=3, help="attempts per row before it is marked ERROR")
+    parser.add_argument("--batch-tokens", type=int, default=0,
+                        help="pack several posts into one request up to this many input tokens (default: off)")
+    parser.add_argument("--batch-size", type=int, default=20, help="maximum number of posts per batched request")
+    parser.add_argument("--compact", action="store_true",
+                        help="rewrite the progress journal with one record per row when the run finishes")
+    parser.add_argument("--input", default="data.csv", help="input CSV with index, full_text and is_aduan columns")
+    parser.add_argument("--read-chunksize", type=int, default=10000, help="rows of the input CSV parsed at a time")
+    parser.add_argument("--retokenize", action="store_true",
+                        help="build the final output by re-tokenizing every tagged row instead of reusing incremental tokens")
+    parser.add_argument("--cache", default=CACHE_FILE, help="SQLite file caching model responses by post text")
+    parser.add_argument("--no-cache", action="store_true", help="always send every post to the API")
+    parser.add_argument("--cache-max-mb", type=int, default=512, help="size at which old cached responses are evicted")
+    parser.add_argument("--cache-normalize", action="store_true",
+                        help="treat posts differing only in URLs, mentions or whitespace as duplicates")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="run as worker K of M (e.g. 0/4), tagging only that partition of the data index")
+    parser.add_argument("--api-url", default=OPENROUTER_URL, help="chat-completions endpoint")
+    parser.add_argument("--metrics-file", default=METRICS_FILE, help="JSON file the run metrics are written to")
+    parser.add_argument("--metrics-interval", type=float, default=60,
+                        help="seconds between metrics summaries in the log (default 60)")
+    parser.add_argument("--retag", action="store_true",
+                        help="re-tag rows marked ERROR or whose output failed validation in earlier runs")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream completions, capping output length and aborting ones that stop echoing the input")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     try:
-        # Load the original data
-        print("Loading data...")
-        df = pd.read_csv('data.csv')
-        aduan_texts_full = df[df['is_aduan'] == 1][['index','full_text']].dropna()
-        print(f"Total aduan texts: {len(aduan_texts_full)}")
-        
-        # # take first 1000 rows
-        # aduan_texts_full = aduan_texts_full.head(1000)
-
         # load .env
         load_dotenv()
 
         # read api_key from .env
         api_key = os.getenv('API_KEY')
 
-        # Check if we have previous progress
-        progress_df = load_progress()
-        
-        if progress_df is not None:
-            # Find which rows have already been processed
-            processed_indices = set(progress_df['index'].values)
-            
-            # Filter out already processed rows
-            aduan_texts_full = aduan_texts_full[~aduan_texts_full['index'].isin(processed_indices)]
-            
-            # If we have already processed all rows, use the progress data
-            if len(aduan_texts_full) == 0:
-                aduan_texts_full = progress_df
-                logging.info("All rows were already processed. Using previous progress.")
-            else:
-                # Merge processed data with remaining data to process
-                aduan_texts_full = pd.concat([progress_df, aduan_texts_full])
-                logging.info(f"Resuming processing. {len(processed_indices)} rows already processed, {len(aduan_texts_full) - len(processed_indices)} remaining.")
-        
-        # Ensure tagged_full_text column exists
-        if 'tagged_full_text' not in aduan_texts_full.columns:
-            aduan_texts_full['tagged_full_text'] = None
+        # Shard workers keep their own journal and token file, merged later by shard.py
+        progress_file, annotations_file = PROGRESS_FILE, ANNOTATIONS_FILE
+        if args.shard is not None:
+            progress_file = shard_filename(PROGRESS_FILE, args.shard)
+            annotations_file = shard_filename(ANNOTATIONS_FILE, args.shard)
+            logging.info(f"Running as shard {args.shard[0]} of {args.shard[1]}")
+        else:
+            import_legacy_progress()
+
+        # Rows that already have a result in the progress journal are skipped while reading
+        done_indices = processed_indices(progress_file)
+        if done_indices:
+            logging.info(f"Resuming processing. {len(done_indices)} rows already processed.")
+
+            # ERROR rows and outputs that fail validation form the re-tag queue
+            report_file = VALIDATION_REPORT_FILE
+            if args.shard is not None:
+                report_file = shard_filename(report_file, args.shard)
+            retag_queue = validate_journal(progress_file, report_file=report_file)
+            if retag_queue and args.retag:
+                done_indices -= retag_queue.keys()
+                print(f"Re-tagging {len(retag_queue)} rows that failed validation (see {report_file})")
+            elif retag_queue:
+                print(f"{len(retag_queue)} tagged rows failed validation (see {report_file}); "
+                      f"rerun with --retag to re-tag only those rows")
+
+        print("Loading data...")
+        total_pending = count_aduan_rows(args.input, skip_indices=done_indices, chunksize=args.read_chunksize,
+                                         shard=args.shard)
+        print(f"Remaining aduan texts: at most {total_pending} ({len(done_indices)} already processed)")
 
         # TAGGING
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }    
-        
         model = "google/gemini-2.5-flash-preview"
-
-        # Chunk size for intermediate saves (save after every N rows)
-        chunk_size = 10
-        last_save = 0
-        
-        for idx, row in tqdm(aduan_texts_full.iterrows(), total=len(aduan_texts_full)):
-            # Skip if already tagged
-            if not pd.isna(aduan_texts_full.loc[idx, 'tagged_full_text']):
-                continue
-                
-            data = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": row['full_text']}
-                ]
-            }
-
-            retries = 3
-            for attempt in range(retries):
-                try:
-                    response = requests.post(url, headers=headers, json=data, timeout=30)
-                    if response.status_code == 200:
-                        result = response.json()
-                        content = result["choices"][0]["message"]["content"].strip()
-                        aduan_texts_full.loc[idx, 'tagged_full_text'] = content
-                        print(f"generated [{row['index']}] : {content}")
-                        logging.info(f"Successfully tagged row {idx} (data ID {row['index']})")
-                        break
-                    else:
-                        error_msg = f"[{row['index']}] Error {response.status_code}: {response.text}"
-                        print(error_msg)
-                        logging.error(error_msg)
-                except requests.exceptions.RequestException as e:
-                    error_msg = f"[{row['index']}] Request failed (attempt {attempt + 1}): {e}"
-                    print(error_msg)
-                    logging.error(error_msg)
-                    time.sleep(2)  # small delay before retry
-            else:
-                error_msg = f"All retries failed for row {idx} (data ID {row['index']})"
-                aduan_texts_full.loc[idx, 'tagged_full_text'] = "ERROR"
-                logging.error(error_msg)
-            
-            # Save progress periodically
-            rows_processed = idx - last_save + 1
-            if rows_processed >= chunk_size:
-                save_progress(aduan_texts_full)
-                
-                # Also tokenize and save the chunk of newly tagged data
-                chunk_data = aduan_texts_full.iloc[last_save:idx+1]
-                tokenize_and_save(chunk_data, output_prefix="chunk")
-                
-                last_save = idx + 1
-
-        # Save final progress
-        save_progress(aduan_texts_full)
+        client = OpenRouterClient(api_key, model, system_prompt, url=args.api_url, pool_size=args.concurrency,
+                                  stream=args.stream)
+
+        metrics_file = args.metrics_file
+        if args.shard is not None:
+            metrics_file = shard_filename(metrics_file, args.shard)
+        metrics = Metrics(metrics_file, interval=args.metrics_interval)
+
+        # Shared across workers so the whole run stays under the provider's limits
+        limiter = RateLimiter(rpm=args.rpm, tpm=args.tpm)
+
+        def api_tag_fn(text, data_id):
+            return tag_text(client, text, data_id, limiter=limiter, retries=args.retries, metrics=metrics)
+
+        tag_fn = api_tag_fn
+
+        # Duplicate posts are answered from the on-disk cache instead of the API
+        cache = None
+        if not args.no_cache:
+            cache = ResponseCache(model, system_prompt, filename=args.cache,
+                                  max_bytes=args.cache_max_mb * 1024 * 1024, loose=args.cache_normalize,
+                                  is_valid=is_valid_output)
+            tag_fn = cached_tag_fn(cache, tag_fn)
+
+        if args.batch_tokens > 0:
+            batch_client = OpenRouterClient(api_key, model, batch_system_prompt, url=args.api_url,
+                                            pool_size=args.concurrency, stream=args.stream)
+
+            # Posts re-sent alone were already looked up by cached_batch_fn, which
+            # also stores their results, so they bypass the cache here
+            def batch_fn(texts, data_ids):
+                return tag_batch(batch_client, texts, data_ids, api_tag_fn, limiter=limiter, retries=args.retries,
+                                 metrics=metrics)
+
+            if cache is not None:
+                batch_fn = cached_batch_fn(cache, batch_fn)
+
+        # Rows journaled before incremental tokenization existed have no tokens yet
+        if done_indices and not os.path.exists(annotations_file):
+            backfill_annotations(BIOWriter(annotations_file, fsync=False), progress_file)
+
+        # Every result is tokenized, then journaled, as soon as it arrives. Tokens
+        # go first so that every journaled row is guaranteed to have them.
+        bio_writer = BIOWriter(annotations_file)
+        journal = ProgressJournal(progress_file)
+
+        # Rows are streamed from the input file straight into the tagging workers
+        rows = (
+            ((data_id, full_text), data_id, full_text)
+            for data_id, full_text in iter_aduan_rows(args.input, skip_indices=done_indices,
+                                                      chunksize=args.read_chunksize, shard=args.shard)
+        )
+
+        if args.batch_tokens > 0:
+            results = tag_rows_batched(rows, batch_fn, concurrency=args.concurrency,
+                                       max_tokens=args.batch_tokens, max_size=args.batch_size)
+        else:
+            results = tag_rows(rows, tag_fn, concurrency=args.concurrency)
+
+        for (data_id, full_text), content in tqdm(results, total=total_pending):
+            with metrics.timed("tokenize"):
+                issues = bio_writer.append(data_id, content)
+            with metrics.timed("validate"):
+                problems = validate_output(content, full_text, issues=issues)
+            if problems:
+                logging.warning(f"Output for data ID {data_id} failed validation: {'; '.join(problems)}")
+            with metrics.timed("checkpoint"):
+                journal.append(data_id, full_text, content)
+
+            metrics.count("rows")
+            if content == "ERROR":
+                metrics.count("errors")
+            if problems:
+                metrics.count("invalid_rows")
+            metrics.maybe_report()
+
+        bio_writer.close()
+        journal.close()
+        if cache is not None:
+            print(cache.summary())
+            logging.info(cache.summary())
+            metrics.set("cache_hits", cache.hits)
+            metrics.set("cache_misses", cache.misses)
+            cache.close()
+        if args.compact:
+            compact_progress(progress_file)
         
-        # Final tokenization of all data
-        final_tokens_df = tokenize_and_save(aduan_texts_full, output_prefix="final")
+        if args.shard is not None:
+            print(f"Shard done. Merge all shards with: python shard.py merge --shards {args.shard[1]}")
+        elif args.retokenize:
+            # Rebuild all tokens from the journal, e.g. after the tokenizer changed
+            aduan_texts_full = load_progress(progress_file)
+            with metrics.timed("finalize"):
+                tokenize_and_save(aduan_texts_full, output_prefix="final")
+        else:
+            # Final output is the incremental tokens, newest block per row
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_filename = f"final_annotated_data_{timestamp}.csv"
+            with metrics.timed("finalize"):
+                write_final_annotations(output_filename, [annotations_file])
+            print(f"Tokenized data saved to: {output_filename}")
+
+        metrics.report()
+        print(f"Metrics: {metrics.summary()}")
+        if metrics_file:
+            print(f"Metrics saved to: {metrics_file}")
 
         print("Processing completed successfully!")
 
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+METRICS_FILE = "metrics.json"
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, plus recent samples for percentiles"""
+
+    BOUNDS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+    def __init__(self, keep=10000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.recent = deque(maxlen=keep)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.buckets[bisect_left(self.BOUNDS, value)] += 1
+        self.recent.append(value)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def snapshot(self):
+        labels = [f"le_{bound}" for bound in self.BOUNDS] + ["le_inf"]
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class Metrics:
+    """Thread-safe counters, latency histograms and per-stage timings for a tagging run.
+
+    `maybe_report()` logs a one-line summary and rewrites the JSON metrics file
+    at most every `interval` seconds; `report()` does so unconditionally.
+    """
+
+    def __init__(self, filename=METRICS_FILE, interval=60):
+        self.filename = filename
+        self.interval = interval
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.histograms = defaultdict(Histogram)
+        self.stage_seconds = defaultdict(float)
+        self.gauges = {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name, value):
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def set(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timed(self, stage):
+        """Add the time spent in the block to `stage`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds[stage] += elapsed
+                self.histograms[f"{stage}_seconds"].observe(elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            rows = self.counters["rows"]
+            return {
+                "elapsed_seconds": elapsed,
+                "rows_per_second": rows / elapsed if elapsed else 0.0,
+                "error_rate": self.counters["errors"] / rows if rows else 0.0,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "stage_seconds": dict(self.stage_seconds),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            }
+
+    def summary(self, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        counters = snapshot["counters"]
+        request = snapshot["histograms"].get("request_seconds", Histogram().snapshot())
+        stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in snapshot["stage_seconds"].items())
+        return (
+            f"{counters.get('rows', 0):.0f} rows ({snapshot['rows_per_second']:.2f}/s), "
+            f"{counters.get('requests', 0):.0f} requests, {counters.get('retries', 0):.0f} retries, "
+            f"error rate {snapshot['error_rate']:.1%}, "
+            f"latency p50 {request['p50']:.2f}s p95 {request['p95']:.2f}s, "
+            f"tokens {counters.get('prompt_tokens', 0):.0f} in / {counters.get('completion_tokens', 0):.0f} out, "
+            f"cost {counters.get('cost', 0):.4f}"
+            + (f", {stages}" if stages else "")
+        )
+
+    def report(self):
+        snapshot = self.snapshot()
+        self._last_report = time.monotonic()
+        logging.info(f"Metrics: {self.summary(snapshot)}")
+        if self.filename:
+            tmp_filename = f"{self.filename}.tmp"
+            with open(tmp_filename, "w") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_filename, self.filename)
+        return snapshot
+
+    def maybe_report(self):
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report()
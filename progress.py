@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+
+import pandas as pd
+
+PROGRESS_FILE = "tagging_progress.jsonl"
+LEGACY_PROGRESS_FILE = "tagging_progress.csv"
+COLUMNS = ["index", "full_text", "tagged_full_text"]
+
+
+def _plain(value):
+    """Turn numpy scalars into plain Python values so they can be written as JSON"""
+    return value.item() if hasattr(value, "item") else value
+
+
+class ProgressJournal:
+    """Append-only JSONL log of tagged rows, one line per result.
+
+    Every append is flushed and fsynced, so a crash loses at most the line
+    being written, and checkpoint cost does not grow with the run.
+    """
+
+    def __init__(self, filename=PROGRESS_FILE, fsync=True):
+        self.filename = filename
+        self.fsync = fsync
+        # A crash can leave a partial last line; start the next record on a fresh one
+        needs_newline = False
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        self._file = open(filename, "a", encoding="utf-8")
+        if needs_newline:
+            self._file.write("\n")
+
+    def append(self, data_id, full_text, tagged_full_text):
+        record = {"index": _plain(data_id), "full_text": full_text, "tagged_full_text": tagged_full_text}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def iter_progress(filename=PROGRESS_FILE):
+    """Stream journal records, skipping lines left incomplete by a crash"""
+    with open(filename, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping unreadable line {line_no} in {filename}")
+
+
+def read_progress_records(filename=PROGRESS_FILE):
+    """Latest journal record per data index, in first-seen order"""
+    records = {}
+    for record in iter_progress(filename):
+        records[record["index"]] = record
+    return records
+
+
+def import_legacy_progress(filename=PROGRESS_FILE, legacy_filename=LEGACY_PROGRESS_FILE):
+    """Carry progress from the old CSV checkpoint over into the journal, once"""
+    if os.path.exists(filename) or not os.path.exists(legacy_filename):
+        return
+    logging.info(f"Importing previous progress from {legacy_filename} into {filename}")
+    progress_df = pd.read_csv(legacy_filename)
+    journal = ProgressJournal(filename)
+    for row in progress_df.itertuples(index=False):
+        if not pd.isna(row.tagged_full_text):
+            journal.append(row.index, row.full_text, row.tagged_full_text)
+    journal.close()
+
+
+def processed_indices(filename=PROGRESS_FILE):
+    """Data indices that already have a journal record"""
+    if not os.path.exists(filename):
+        return set()
+    return {record["index"] for record in iter_progress(filename)}
+
+
+def load_progress(filename=PROGRESS_FILE):
+    """Load the previous tagging progress if available"""
+    if os.path.exists(filename):
+        logging.info(f"Loading previous progress from {filename}")
+        records = read_progress_records(filename)
+        return pd.DataFrame(list(records.values()), columns=COLUMNS)
+    return None
+
+
+def compact_progress(filename=PROGRESS_FILE):
+    """Rewrite the journal keeping only the latest record per data index"""
+    if not os.path.exists(filename):
+        return
+    records = read_progress_records(filename)
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+    logging.info(f"Compacted {filename} to {len(records)} records")
+    print(f"Compacted {filename} to {len(records)} records")
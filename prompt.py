@@ -167,3 +167,31 @@ Input: "Jl. Asia Afrika macet total karena ada pawai budaya perayaan HUT Kota Ba
 Output:
 "<PLOC>Jl. Asia Afrika</PLOC> <COND>macet total</COND> karena ada <EVT>pawai budaya perayaan HUT Kota Bandung</EVT>. <COND>Penutupan jalan</COND> sejak <PTI>pukul 08.00 pagi</PTI> sampai selesai acara. Hindari <PLOC>jalur ini</PLOC> jika tidak ingin terjebak <COND>kemacetan panjang</COND>."
 """
+
+batch_system_prompt = system_prompt + """
+## Batch Mode
+The input contains several independent posts. Each post is preceded by a marker line of the form `=== POST n ===`.
+- Tag every post independently, following all the rules above.
+- Copy every marker line exactly as it appears, on its own line, before its tagged post.
+- Keep the posts in the same order and DO NOT merge, split, skip or reorder them.
+- DO NOT output anything before the first marker or between posts other than the tagged posts themselves.
+
+### Batch Example:
+Input:
+=== POST 1 ===
+macet parah di tol cikampek km 47
+=== POST 2 ===
+ada pohon tumbang depan sekolah, hati2
+
+Output:
+=== POST 1 ===
+<COND>macet parah</COND> di <PLOC>tol cikampek km 47</PLOC>
+=== POST 2 ===
+ada <OBJ>pohon tumbang</OBJ> <LLOC>depan sekolah</LLOC>, hati2
+"""
+
+# Entity tags the model is allowed to emit (see "Entity Types to Extract" above)
+ENTITY_TAGS = frozenset([
+    "PLOC", "LLOC", "COND", "EVT", "VEH", "OBJ", "PWN",
+    "PWR", "PTI", "CRD", "DAT", "FAC", "QTY", "PRD",
+])
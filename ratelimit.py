@@ -0,0 +1,132 @@
+import datetime
+import email.utils
+import logging
+import random
+import threading
+import time
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def output_token_budget(text):
+    """Completion tokens a tagged copy of `text` may reasonably need: the text plus room for tags"""
+    return 3 * estimate_tokens(text) + 32
+
+
+class RateLimiter:
+    """Token bucket shared by all workers, with requests-per-minute and tokens-per-minute budgets.
+
+    Either budget may be None to leave it unlimited. When the provider throttles
+    us, `throttle()` pauses every worker and lowers the effective rate, which then
+    recovers a little on each successful request.
+    """
+
+    def __init__(self, rpm=None, tpm=None, min_factor=0.1, recovery=0.05):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_factor = min_factor
+        self.recovery = recovery
+        self.factor = 1.0
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm * self.factor / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm * self.factor / 60)
+
+    def acquire(self, tokens=0):
+        """Block until one request of roughly `tokens` tokens fits in the budget"""
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / (self.rpm * self.factor))
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / (self.tpm * self.factor))
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+            time.sleep(wait)
+
+    def settle(self, estimated, actual):
+        """Correct the token budget once the real usage of a request is known"""
+        if self.tpm and actual is not None:
+            with self._lock:
+                self._tokens -= actual - estimated
+
+    def throttle(self, delay):
+        """Pause all workers for `delay` seconds and halve the effective rate.
+
+        Concurrent 429s from the same burst land inside the pause the first one
+        started, so they extend the pause but only halve the rate once.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._paused_until:
+                self.factor = max(self.min_factor, self.factor / 2)
+            self._paused_until = max(self._paused_until, now + delay)
+            factor = self.factor
+        logging.warning(f"Throttled by provider, pausing {delay:.1f}s (rate factor {factor:.2f})")
+
+    def record_success(self):
+        with self._lock:
+            self.factor = min(1.0, self.factor + self.recovery)
+
+
+def retry_after(response):
+    """Seconds to wait according to the response's Retry-After or rate-limit reset headers"""
+    if response is None:
+        return None
+
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(value)
+                now = datetime.datetime.now(datetime.timezone.utc)
+                return max(0.0, (when - now).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    value = response.headers.get("X-RateLimit-Reset")
+    if value:
+        try:
+            reset = float(value)
+        except ValueError:
+            return None
+        # OpenRouter sends an epoch timestamp in milliseconds
+        if reset > 1e12:
+            reset /= 1000
+        if reset > 1e9:
+            return max(0.0, reset - time.time())
+        return max(0.0, reset)
+
+    return None
+
+
+def backoff_delay(attempt, response=None, base=1.0, cap=60.0):
+    """Jittered exponential backoff, never shorter than what the server asked for"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    hinted = retry_after(response)
+    if hinted is not None:
+        delay = max(delay, min(hinted, cap * 5))
+    return delay
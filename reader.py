@@ -0,0 +1,53 @@
+import zlib
+
+import pandas as pd
+
+INPUT_COLUMNS = ["index", "full_text", "is_aduan"]
+
+
+def shard_of(data_id, num_shards):
+    """Deterministic shard number of a data index"""
+    if isinstance(data_id, float) and data_id.is_integer():
+        data_id = int(data_id)
+    if isinstance(data_id, int):
+        return data_id % num_shards
+    return zlib.crc32(str(data_id).encode("utf-8")) % num_shards
+
+
+def in_shard(indices, shard):
+    """Boolean mask of the data indices that belong to `shard`, a (number, count) pair"""
+    number, count = shard
+    if pd.api.types.is_integer_dtype(indices):
+        return indices % count == number
+    return indices.map(lambda data_id: shard_of(data_id, count) == number)
+
+
+def iter_aduan_rows(filename="data.csv", skip_indices=(), chunksize=10000, shard=None):
+    """Yield (data_id, full_text) for complaint rows, reading the CSV in chunks.
+
+    Only the columns the tagger needs are parsed, and rows whose data index is
+    in `skip_indices` or outside `shard` are dropped while reading.
+    """
+    for chunk in pd.read_csv(filename, usecols=INPUT_COLUMNS, chunksize=chunksize):
+        chunk = chunk[chunk["is_aduan"] == 1].dropna(subset=["index", "full_text"])
+        if shard is not None:
+            chunk = chunk[in_shard(chunk["index"], shard)]
+        if skip_indices:
+            chunk = chunk[~chunk["index"].isin(skip_indices)]
+        yield from zip(chunk["index"].tolist(), chunk["full_text"].tolist())
+
+
+def count_aduan_rows(filename="data.csv", skip_indices=(), chunksize=10000, shard=None):
+    """Upper bound on the complaint rows left to tag, without parsing the text column.
+
+    Rows with an empty `full_text` are counted here but skipped by iter_aduan_rows.
+    """
+    total = 0
+    for chunk in pd.read_csv(filename, usecols=["index", "is_aduan"], chunksize=chunksize):
+        chunk = chunk[(chunk["is_aduan"] == 1) & chunk["index"].notna()]
+        if shard is not None:
+            chunk = chunk[in_shard(chunk["index"], shard)]
+        if skip_indices:
+            chunk = chunk[~chunk["index"].isin(skip_indices)]
+        total += len(chunk)
+    return total
@@ -0,0 +1,153 @@
+"""Run the tagger as several shard workers and merge their outputs.
+
+Worker K of M (``python main.py --shard K/M``) only tags rows whose data index
+falls in partition K, and writes its own progress journal and token file.
+
+    python shard.py run --workers 4 [main.py options]   # local workers, then merge
+    python shard.py merge --shards 4                      # merge shard outputs
+"""
+import argparse
+import datetime
+import logging
+import os
+import subprocess
+import sys
+
+from bio import ANNOTATIONS_FILE, write_final_annotations
+from progress import PROGRESS_FILE, read_progress_records
+from reader import iter_aduan_rows, shard_of
+
+
+def parse_shard(value):
+    """Parse a "K/M" shard spec into (K, M)"""
+    try:
+        number, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like K/M, got {value!r}")
+    if count < 1 or not 0 <= number < count:
+        raise argparse.ArgumentTypeError(f"shard {value!r} needs 0 <= K < M")
+    return number, count
+
+
+def shard_filename(filename, shard):
+    """Per-shard variant of an output file name, e.g. tagging_progress.shard-0-of-4.jsonl"""
+    root, ext = os.path.splitext(filename)
+    number, count = shard
+    return f"{root}.shard-{number}-of-{count}{ext}"
+
+
+def merge_shards(num_shards, input_filename="data.csv", output_filename=None, sample=10):
+    """Combine shard outputs into one final BIO dataset, reporting duplicate, misplaced and missing rows.
+
+    Returns a dict with the lists of duplicates, misplaced rows and gaps.
+    """
+    owner = {}
+    duplicates, misplaced, missing_shards = [], [], []
+    errors = 0
+    token_files = []
+
+    for number in range(num_shards):
+        shard = (number, num_shards)
+        progress_file = shard_filename(PROGRESS_FILE, shard)
+        annotations_file = shard_filename(ANNOTATIONS_FILE, shard)
+        if not os.path.exists(progress_file):
+            missing_shards.append(number)
+            continue
+        if os.path.exists(annotations_file):
+            token_files.append(annotations_file)
+
+        for data_id, record in read_progress_records(progress_file).items():
+            if shard_of(data_id, num_shards) != number:
+                misplaced.append((data_id, number))
+            if data_id in owner:
+                duplicates.append((data_id, owner[data_id], number))
+            else:
+                owner[data_id] = number
+            if record["tagged_full_text"] == "ERROR":
+                errors += 1
+
+    expected = {data_id for data_id, _ in iter_aduan_rows(input_filename)}
+    gaps = sorted(expected - owner.keys(), key=str)
+    unexpected = sorted(owner.keys() - expected, key=str)
+
+    if output_filename is None:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = f"final_annotated_data_{timestamp}.csv"
+    tokens = write_final_annotations(output_filename, token_files)
+
+    report = [
+        f"Merged {len(owner)} rows from {num_shards - len(missing_shards)}/{num_shards} shards "
+        f"({tokens} tokens) into {output_filename}",
+        f"  rows marked ERROR: {errors}",
+    ]
+    if missing_shards:
+        report.append(f"  shards without output: {missing_shards}")
+    if duplicates:
+        report.append(f"  rows tagged by more than one shard: {len(duplicates)}, e.g. {duplicates[:sample]}")
+    if misplaced:
+        report.append(f"  rows outside their shard's partition: {len(misplaced)}, e.g. {misplaced[:sample]}")
+    if gaps:
+        report.append(f"  input rows not tagged by any shard: {len(gaps)}, e.g. {gaps[:sample]}")
+    if unexpected:
+        report.append(f"  tagged rows not in {input_filename}: {len(unexpected)}, e.g. {unexpected[:sample]}")
+    for line in report:
+        print(line)
+        logging.info(line)
+
+    return {"duplicates": duplicates, "misplaced": misplaced, "gaps": gaps, "missing_shards": missing_shards}
+
+
+def run_local(num_workers, main_args):
+    """Start `num_workers` shard workers of main.py on this machine and wait for all of them"""
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    workers = [
+        subprocess.Popen([sys.executable, main_path, "--shard", f"{number}/{num_workers}", *main_args])
+        for number in range(num_workers)
+    ]
+    return [worker.wait() for worker in workers]
+
+
+def main(argv=None):
+    logging.basicConfig(
+        filename='processing_log.log',
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="Sharded tagging runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run local shard workers, then merge their outputs")
+    run.add_argument("--workers", type=int, required=True, help="number of worker processes")
+    run.add_argument("--rpm", type=int, default=None, help="requests-per-minute budget, split across the workers")
+    run.add_argument("--tpm", type=int, default=None, help="tokens-per-minute budget, split across the workers")
+
+    merge = commands.add_parser("merge", help="merge shard outputs into the final BIO dataset")
+    merge.add_argument("--shards", type=int, required=True, help="number of shards the run was split into")
+
+    for command in (run, merge):
+        command.add_argument("--input", default="data.csv", help="input CSV the shards were tagged from")
+        command.add_argument("--output", default=None, help="final BIO CSV (default: timestamped)")
+
+    args, main_args = parser.parse_known_args(argv)
+    if args.command == "merge" and main_args:
+        parser.error(f"unrecognized arguments: {' '.join(main_args)}")
+
+    if args.command == "run":
+        # Every worker has its own rate limiter, so each gets an equal share of the budget
+        for option, budget in (("--rpm", args.rpm), ("--tpm", args.tpm)):
+            if budget is not None:
+                main_args = [option, str(max(1, budget // args.workers)), *main_args]
+        codes = run_local(args.workers, ["--input", args.input, *main_args])
+        if any(codes):
+            print(f"Worker exit codes: {codes}")
+        num_shards = args.workers
+    else:
+        num_shards = args.shards
+
+    result = merge_shards(num_shards, input_filename=args.input, output_filename=args.output)
+    if result["duplicates"] or result["gaps"] or result["missing_shards"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from ratelimit import backoff_delay, estimate_tokens, output_token_budget
+from validate import divergence
+
+
+def tag_text(client, text, data_id, limiter=None, retries=3, metrics=None):
+    """Tag a single text with the model, returning "ERROR" once all retries fail"""
+    # The tagged output echoes the input, so budget for it twice
+    estimated_tokens = client.system_tokens + 2 * estimate_tokens(text)
+
+    for attempt in range(retries):
+        response = None
+        if limiter is not None:
+            limiter.acquire(estimated_tokens)
+        try:
+            response, timing, completion = client.complete(
+                text, max_tokens=output_token_budget(text), check=lambda partial: divergence(partial, text)
+            )
+            if metrics is not None:
+                metrics.count("requests")
+                metrics.count(f"status_{response.status_code}")
+                metrics.observe("request_seconds", timing["total"])
+                metrics.observe("ttfb_seconds", timing["ttfb"])
+                metrics.observe("connect_seconds", timing["connect"])
+                if timing.get("ttft") is not None:
+                    metrics.observe("ttft_seconds", timing["ttft"])
+            if response.status_code == 200 and completion["aborted"]:
+                if metrics is not None:
+                    metrics.count("aborted_generations")
+                error_msg = f"[{data_id}] Generation aborted (attempt {attempt + 1}): {completion['aborted']}"
+                print(error_msg)
+                logging.error(error_msg)
+            elif response.status_code == 200:
+                content = completion["content"].strip()
+                usage = completion["usage"]
+                if limiter is not None:
+                    limiter.record_success()
+                    limiter.settle(estimated_tokens, usage.get("total_tokens"))
+                if metrics is not None:
+                    metrics.count("prompt_tokens", usage.get("prompt_tokens", 0))
+                    metrics.count("completion_tokens", usage.get("completion_tokens", 0))
+                    metrics.count("cost", usage.get("cost", 0))
+                print(f"generated [{data_id}] : {content}")
+                ttft = f", ttft {timing['ttft']:.3f}s" if timing.get("ttft") is not None else ""
+                logging.info(
+                    f"Successfully tagged data ID {data_id} "
+                    f"(connect {timing['connect']:.3f}s, ttfb {timing['ttfb']:.3f}s{ttft}, total {timing['total']:.3f}s)"
+                )
+                return content
+            else:
+                error_msg = f"[{data_id}] Error {response.status_code} (attempt {attempt + 1}): {response.text}"
+                print(error_msg)
+                logging.error(error_msg)
+        except requests.exceptions.RequestException as e:
+            if metrics is not None:
+                metrics.count("request_exceptions")
+            error_msg = f"[{data_id}] Request failed (attempt {attempt + 1}): {e}"
+            print(error_msg)
+            logging.error(error_msg)
+
+        delay = backoff_delay(attempt, response)
+        if limiter is not None and response is not None and response.status_code == 429:
+            limiter.throttle(delay)
+        if attempt + 1 < retries:
+            if metrics is not None:
+                metrics.count("retries")
+            time.sleep(delay)
+
+    logging.error(f"All retries failed for data ID {data_id}")
+    return "ERROR"
+
+
+def tag_rows(rows, tag_fn, concurrency=8):
+    """Tag rows concurrently, yielding (key, tagged_text) in the same order as `rows`.
+
+    `rows` is an iterable of (key, data_id, text) and is consumed lazily, so at
+    most `concurrency * 2` requests are queued at any time.
+    """
+    max_pending = max(1, concurrency) * 2
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = deque()
+        for key, data_id, text in rows:
+            pending.append((key, executor.submit(tag_fn, text, data_id)))
+            if len(pending) >= max_pending:
+                key, future = pending.popleft()
+                yield key, future.result()
+        while pending:
+            key, future = pending.popleft()
+            yield key, future.result()
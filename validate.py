@@ -0,0 +1,87 @@
+import csv
+import html
+import logging
+import re
+
+from bio import tokenize_tagged
+from progress import iter_progress
+
+VALIDATION_REPORT_FILE = "validation_report.csv"
+TAG_RE = re.compile(r"</?[A-Za-z][A-Za-z0-9]*>")
+PARTIAL_ENTITY_RE = re.compile(r"&#?\w*$")
+
+
+def strip_tags(tagged_text):
+    """Remove XML entity tags, leaving the text the model was given"""
+    return TAG_RE.sub("", tagged_text)
+
+
+def _comparable(text):
+    # The tokenizer unescapes HTML entities, so "&amp;" and "&" are the same text to it
+    return " ".join(html.unescape(text).split())
+
+
+def matches_source(tagged_text, source_text):
+    """True if the tagged output is the source text with only tags added"""
+    return _comparable(strip_tags(tagged_text)) == _comparable(source_text)
+
+
+def divergence(partial_output, source_text):
+    """Why a partial streamed output can no longer become `source_text` with tags added, or None"""
+    # An unfinished tag at the end may still turn out fine
+    cut = partial_output.rfind("<")
+    if cut != -1 and ">" not in partial_output[cut:]:
+        partial_output = partial_output[:cut]
+    # So may an unfinished HTML entity such as "&am"
+    produced = _comparable(PARTIAL_ENTITY_RE.sub("", strip_tags(partial_output)))
+    if _comparable(source_text).startswith(produced):
+        return None
+    return f"output diverged from the input after {len(produced)} characters"
+
+
+def validate_output(tagged_text, source_text, issues=None):
+    """Problems with a model output for `source_text`; an empty list means it is usable.
+
+    `issues` are the (data_id, message) tag issues already found while
+    tokenizing the output, e.g. by BIOWriter.append; if None, the tags are checked here.
+    """
+    if not isinstance(tagged_text, str) or not tagged_text.strip():
+        return ["empty output"]
+    if tagged_text == "ERROR":
+        return ["tagging failed (ERROR)"]
+
+    if issues is None:
+        issues = []
+        tokenize_tagged(None, tagged_text, None, issues)
+    problems = [message for _, message in issues]
+    if isinstance(source_text, str) and not matches_source(tagged_text, source_text):
+        problems.append("text differs from source")
+    return problems
+
+
+def is_valid_output(tagged_text, source_text):
+    return not validate_output(tagged_text, source_text)
+
+
+def validate_journal(progress_file, report_file=VALIDATION_REPORT_FILE):
+    """Validate the latest journal record of every row, streaming the journal.
+
+    Returns {data index: problems} for the rows that should be re-tagged and,
+    if `report_file` is set, writes them to that CSV for inspection.
+    """
+    failing = {}
+    for record in iter_progress(progress_file):
+        problems = validate_output(record["tagged_full_text"], record["full_text"])
+        if problems:
+            failing[record["index"]] = problems
+        else:
+            failing.pop(record["index"], None)
+
+    if report_file:
+        with open(report_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["index", "problems"])
+            for data_id, problems in failing.items():
+                writer.writerow([data_id, "; ".join(problems)])
+        logging.info(f"Validation report ({len(failing)} failing rows) saved to: {report_file}")
+    return failing